@@ -5,20 +5,28 @@ SleepHQ API client for uploading CPAP data files.
 Handles OAuth2 authentication, token management, team ID retrieval, and file uploads.
 """
 
+import concurrent.futures
 import hashlib
 import json
 import logging
+import os
 import pathlib
 import time
 from typing import Optional
 
 import requests
+from requests import adapters
+from urllib3.util import retry
 
 logger = logging.getLogger(__name__)
 
 SLEEPHQ_BASE_URL = "https://sleephq.com"
 OAUTH_ENDPOINT = f"{SLEEPHQ_BASE_URL}/oauth/token"
 TEAMS_ENDPOINT = f"{SLEEPHQ_BASE_URL}/api/v1/teams"
+# Number of files uploaded concurrently (must not exceed the session's pool_maxsize)
+UPLOAD_WORKERS = 8
+# Read size used when hashing files on Python versions without hashlib.file_digest
+HASH_CHUNK_SIZE = 1024 * 1024
 
 
 class SleepHQClient:
@@ -28,12 +36,12 @@ class SleepHQClient:
     Attributes:
         client_id (str): OAuth2 client ID
         client_secret (str): OAuth2 client secret
-        username (str): SleepHQ username
-        password (str): SleepHQ password
         token_file (pathlib.Path): Path to store access token
         access_token (str): Current access token
         token_expiry (float): Unix timestamp when token expires
         team_id (str): Team ID for API requests
+        hash_cache_file (pathlib.Path): Path to store computed content hashes
+        hash_cache (dict): Content hashes keyed by absolute file path (None until first needed)
         session (requests.Session): Session for HTTP requests
     """
 
@@ -55,8 +63,6 @@ class SleepHQClient:
         """
         self.client_id = client_id
         self.client_secret = client_secret
-        self.username = None
-        self.password = None
         self.access_token = None
         self.token_expiry = 0
         self.team_id = None
@@ -64,8 +70,26 @@ class SleepHQClient:
         if token_file is None:
             token_file = pathlib.Path("~/.config/ezshare_resmed/sleephq_token.json").expanduser()
         self.token_file = token_file
+        self.hash_cache_file = token_file.parent / 'hash_cache.json'
+        self.hash_cache = None
+        self._hash_cache_dirty = False
         
         self.session = requests.Session()
+        # Keep enough pooled connections to sleephq.com for long upload batches.
+        # Failed connections are retried for every method, since nothing was sent
+        # yet, but read errors and 5xx responses only for GET: a POST may already
+        # have created an import or uploaded a file on the server.
+        session_retry = retry.Retry(
+            total=5,
+            backoff_factor=0.5,
+            status_forcelist=(500, 502, 503, 504),
+            allowed_methods=frozenset(['GET']),
+        )
+        self.session.mount('https://', adapters.HTTPAdapter(
+            pool_connections=1,
+            pool_maxsize=32,
+            max_retries=session_retry,
+        ))
         self._load_token()
 
     def _load_token(self) -> None:
@@ -87,6 +111,7 @@ class SleepHQClient:
                 self.access_token = None
                 self.token_expiry = 0
             else:
+                self.session.headers['Authorization'] = f'Bearer {self.access_token}'
                 logger.debug("Loaded valid stored token")
         except (json.JSONDecodeError, IOError) as e:
             logger.warning(f"Failed to load token file: {e}")
@@ -104,14 +129,71 @@ class SleepHQClient:
         }
         
         try:
-            with open(self.token_file, 'w') as f:
+            # Create the file with restrictive permissions for security, so the
+            # mode doesn't have to be reapplied on every save
+            fd = os.open(self.token_file, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+            with os.fdopen(fd, 'w') as f:
                 json.dump(token_data, f)
-            # Set restrictive permissions for security
-            self.token_file.chmod(0o600)
             logger.debug("Token saved to file")
         except IOError as e:
             logger.error(f"Failed to save token file: {e}")
 
+    def _load_hash_cache(self) -> None:
+        """
+        Load previously computed content hashes if the cache file exists.
+
+        The cache is only loaded the first time it is needed, so runs with
+        nothing to upload never read it.
+        """
+        if self.hash_cache is not None:
+            return
+        
+        self.hash_cache = {}
+        if not self.hash_cache_file.exists():
+            return
+        
+        try:
+            with open(self.hash_cache_file, 'r') as f:
+                hash_cache = json.load(f)
+        except (ValueError, IOError) as e:
+            logger.warning(f"Failed to load hash cache file: {e}")
+            return
+        
+        # The cache is optional and may have been edited by hand, so ignore
+        # anything that isn't a mapping; individual entries are checked on use
+        if not isinstance(hash_cache, dict):
+            logger.warning(f"Ignoring hash cache file with unexpected format: {self.hash_cache_file}")
+            return
+        
+        self.hash_cache = hash_cache
+        logger.debug(f"Loaded {len(self.hash_cache)} cached content hash(es)")
+
+    def _save_hash_cache(self) -> None:
+        """Save computed content hashes to file if any were added since the last save."""
+        if not self._hash_cache_dirty:
+            return
+        
+        # Write to a temporary file and swap it into place, so an interrupted
+        # save never leaves a truncated cache behind. The cache is optional, so
+        # failures are logged rather than raised.
+        tmp_file = self.hash_cache_file.with_suffix('.tmp')
+        try:
+            self.hash_cache_file.parent.mkdir(parents=True, exist_ok=True)
+            with open(tmp_file, 'w') as f:
+                # Machine-read only, so write it without whitespace
+                json.dump(self.hash_cache, f, separators=(',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_file, self.hash_cache_file)
+            self._hash_cache_dirty = False
+            logger.debug("Hash cache saved to file")
+        except OSError as e:
+            logger.warning(f"Failed to save hash cache file: {e}")
+            try:
+                tmp_file.unlink(missing_ok=True)
+            except OSError:
+                pass
+
     def authenticate(self, username: str, password: str) -> bool:
         """
         Authenticate with SleepHQ API using OAuth2 password grant flow.
@@ -123,13 +205,10 @@ class SleepHQClient:
         Returns:
             bool: True if authentication successful, False otherwise
         """
-        self.username = username
-        self.password = password
-        
         logger.debug("Authenticating with SleepHQ API")
         
         try:
-            response = requests.post(
+            response = self.session.post(
                 OAUTH_ENDPOINT,
                 data={
                     'client_id': self.client_id,
@@ -147,6 +226,8 @@ class SleepHQClient:
             self.access_token = token_data['access_token']
             # OAuth2 password grant doesn't provide refresh tokens, so we calculate expiry
             self.token_expiry = time.time() + token_data.get('expires_in', 7200)
+            # Authorize every subsequent request made through the session
+            self.session.headers['Authorization'] = f'Bearer {self.access_token}'
             
             logger.info("✅ Successfully authenticated with SleepHQ API")
             
@@ -177,7 +258,6 @@ class SleepHQClient:
         try:
             response = self.session.get(
                 TEAMS_ENDPOINT,
-                headers={'Authorization': f'Bearer {self.access_token}'},
                 timeout=10,
             )
             response.raise_for_status()
@@ -246,7 +326,6 @@ class SleepHQClient:
             
             response = self.session.post(
                 import_url,
-                headers={'Authorization': f'Bearer {self.access_token}'},
                 timeout=30,
             )
             response.raise_for_status()
@@ -273,6 +352,7 @@ class SleepHQClient:
             if e.response.status_code == 401:
                 logger.error("Authentication token expired or invalid")
                 self.access_token = None
+                self.session.headers.pop('Authorization', None)
             else:
                 logger.error(f"Failed to create import: {e}")
             return None
@@ -280,7 +360,7 @@ class SleepHQClient:
             logger.error(f"Failed to create import: {e}")
             return None
 
-    def _calculate_content_hash(self, file_path: pathlib.Path, file_content: bytes) -> str:
+    def _calculate_content_hash(self, file_path: pathlib.Path) -> str:
         """
         Calculate the content hash for a file.
 
@@ -288,15 +368,49 @@ class SleepHQClient:
         For example, if the file's name is "file.txt" and content is "Hello, World!",
         the hash would be MD5("Hello, World!file.txt").
 
+        The file is streamed through the hash so large files are never held in
+        memory (using hashlib.file_digest on Python 3.11+). Hashes are cached by
+        path, size, and modification time, so unchanged files are not re-read.
+
         Args:
-            file_path: Path to the file (used for the name)
-            file_content: The raw bytes of the file content
+            file_path: Path to the file to hash
 
         Returns:
             str: The MD5 hash as a hexadecimal string
         """
-        hash_input = file_content + file_path.name.encode('utf-8')
-        return hashlib.md5(hash_input).hexdigest()
+        self._load_hash_cache()
+        stat = file_path.stat()
+        # abspath is a pure string operation, unlike resolve() which lstat()s
+        # every path component
+        cache_key = os.path.abspath(file_path)
+        cached = self.hash_cache.get(cache_key)
+        # Malformed entries are treated as a miss and overwritten below
+        if (
+            isinstance(cached, dict)
+            and isinstance(cached.get('content_hash'), str)
+            and type(cached.get('size')) is int
+            and type(cached.get('mtime_ns')) is int
+            and cached['size'] == stat.st_size
+            and cached['mtime_ns'] == stat.st_mtime_ns
+        ):
+            return cached['content_hash']
+        
+        with open(file_path, 'rb') as f:
+            if hasattr(hashlib, 'file_digest'):
+                content_hash = hashlib.file_digest(f, 'md5')
+            else:
+                content_hash = hashlib.md5()
+                for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+                    content_hash.update(chunk)
+        content_hash.update(file_path.name.encode('utf-8'))
+        
+        self.hash_cache[cache_key] = {
+            'size': stat.st_size,
+            'mtime_ns': stat.st_mtime_ns,
+            'content_hash': content_hash.hexdigest(),
+        }
+        self._hash_cache_dirty = True
+        return self.hash_cache[cache_key]['content_hash']
 
     def _get_relative_path(self, file_path: pathlib.Path, base_path: Optional[pathlib.Path]) -> str:
         """
@@ -312,6 +426,16 @@ class SleepHQClient:
         if base_path is None:
             return "./"
         
+        # Fast path: files found under base_path share its string prefix, so
+        # the relative part can be sliced off without walking both paths
+        parent = str(file_path.parent)
+        base = os.path.join(str(base_path), '')
+        if parent == base or parent + os.sep == base:
+            return "./"
+        if parent.startswith(base):
+            # Ensure forward slashes and trailing slash
+            return "./" + parent[len(base):].replace("\\", "/") + "/"
+        
         try:
             # Get the relative path from base to file's parent directory
             relative = file_path.parent.relative_to(base_path)
@@ -322,7 +446,7 @@ class SleepHQClient:
                 return "./" + str(relative).replace("\\", "/") + "/"
         except ValueError:
             # file_path is not relative to base_path
-            logger.warning(f"Could not determine relative path for {file_path}, using root")
+            logger.warning("Could not determine relative path for %s, using root", file_path)
             return "./"
 
     def add_file_to_import(
@@ -330,6 +454,7 @@ class SleepHQClient:
         import_id: str,
         file_path: pathlib.Path,
         base_path: Optional[pathlib.Path] = None,
+        relative_path: Optional[str] = None,
     ) -> bool:
         """
         Add a file to an existing import.
@@ -338,6 +463,8 @@ class SleepHQClient:
             import_id: The import ID to add the file to
             file_path: Path to the file to upload
             base_path: Base path (SD card root) to calculate relative path from
+            relative_path: Precomputed relative path in SleepHQ format (skips
+                calculating it from base_path)
 
         Returns:
             bool: True if file was added successfully, False otherwise
@@ -346,55 +473,85 @@ class SleepHQClient:
             logger.error("Not authenticated with SleepHQ API")
             return False
         
-        if not file_path.exists():
-            logger.error(f"File does not exist: {file_path}")
+        added = self._add_file_to_import(import_id, file_path, base_path=base_path, relative_path=relative_path)
+        if not self.access_token:
+            self.session.headers.pop('Authorization', None)
+        return added
+
+    def _add_file_to_import(
+        self,
+        import_id: str,
+        file_path: pathlib.Path,
+        base_path: Optional[pathlib.Path] = None,
+        relative_path: Optional[str] = None,
+    ) -> bool:
+        """
+        Add a file to an existing import without checking token expiry first.
+
+        Used by upload_files, which checks authentication once for the whole batch.
+        Only the cheap access_token check is repeated, so the remaining files fail
+        fast once a 401 has invalidated the token. This runs on worker threads, so
+        it must not modify the shared session headers.
+
+        Args:
+            import_id: The import ID to add the file to
+            file_path: Path to the file to upload
+            base_path: Base path (SD card root) to calculate relative path from
+            relative_path: Precomputed relative path in SleepHQ format (skips
+                calculating it from base_path)
+
+        Returns:
+            bool: True if file was added successfully, False otherwise
+        """
+        if not self.access_token:
+            logger.debug("Skipping %s: no valid access token", file_path.name)
             return False
         
         try:
             upload_url = f"{SLEEPHQ_BASE_URL}/api/v1/imports/{import_id}/files"
             
-            # Read file content for hash calculation and upload
-            with open(file_path, 'rb') as f:
-                file_content = f.read()
-            
             # Calculate required fields
             file_name = file_path.name
-            relative_path = self._get_relative_path(file_path, base_path)
-            content_hash = self._calculate_content_hash(file_path, file_content)
+            if relative_path is None:
+                relative_path = self._get_relative_path(file_path, base_path)
+            content_hash = self._calculate_content_hash(file_path)
             
-            logger.debug(f"Uploading {file_name}: path={relative_path}, hash={content_hash}")
+            logger.debug("Uploading %s: path=%s, hash=%s", file_name, relative_path, content_hash)
             
-            # Prepare multipart form data
-            files = {
-                'file': (file_name, file_content, 'application/octet-stream'),
-            }
             data = {
                 'name': file_name,
                 'path': relative_path,
                 'content_hash': content_hash,
             }
             
-            response = self.session.post(
-                upload_url,
-                headers={'Authorization': f'Bearer {self.access_token}'},
-                files=files,
-                data=data,
-                timeout=30,
-            )
+            # Hand the open file to requests rather than a pre-read copy of its content
+            with open(file_path, 'rb') as f:
+                files = {
+                    'file': (file_name, f, 'application/octet-stream'),
+                }
+                response = self.session.post(
+                    upload_url,
+                    files=files,
+                    data=data,
+                    timeout=30,
+                )
             response.raise_for_status()
             
-            logger.debug(f"Added file {file_name} to import {import_id}")
+            logger.debug("Added file %s to import %s", file_name, import_id)
             return True
             
+        except FileNotFoundError:
+            logger.error("File does not exist: %s", file_path)
+            return False
         except requests.exceptions.HTTPError as e:
             if e.response.status_code == 401:
                 logger.error("Authentication token expired or invalid")
                 self.access_token = None
             else:
-                logger.error(f"Failed to add file {file_path.name}: {e}")
+                logger.error("Failed to add file %s: %s", file_path.name, e)
             return False
         except requests.exceptions.RequestException as e:
-            logger.error(f"Failed to add file {file_path.name}: {e}")
+            logger.error("Failed to add file %s: %s", file_path.name, e)
             return False
 
     def process_import(self, import_id: str) -> bool:
@@ -416,7 +573,6 @@ class SleepHQClient:
             
             response = self.session.post(
                 process_url,
-                headers={'Authorization': f'Bearer {self.access_token}'},
                 timeout=30,
             )
             response.raise_for_status()
@@ -428,6 +584,7 @@ class SleepHQClient:
             if e.response.status_code == 401:
                 logger.error("Authentication token expired or invalid")
                 self.access_token = None
+                self.session.headers.pop('Authorization', None)
             else:
                 logger.error(f"Process request failed for import {import_id}: {e}")
             return False
@@ -469,16 +626,46 @@ class SleepHQClient:
             logger.error("Failed to create import, aborting upload")
             return 0, len(file_paths)
         
-        # Step 2: Add all files to the import
+        # Step 2: Add all files to the import, several at a time over the
+        # session's connection pool. create_import() has just verified
+        # authentication, so it is not re-checked for every file.
         successful = 0
         failed = 0
         
+        # Files in the same folder share a relative path, so derive it once per folder
+        relative_paths = {}
         for file_path in file_paths:
-            if self.add_file_to_import(import_id, file_path, base_path=base_path):
-                successful += 1
-                logger.info(f"✅ Added file to import: {file_path.name}")
-            else:
-                failed += 1
+            if file_path.parent not in relative_paths:
+                relative_paths[file_path.parent] = self._get_relative_path(file_path, base_path)
+        
+        # Load the hash cache here rather than letting the worker threads race to do it
+        self._load_hash_cache()
+        
+        with concurrent.futures.ThreadPoolExecutor(max_workers=UPLOAD_WORKERS) as executor:
+            futures = {
+                executor.submit(
+                    self._add_file_to_import,
+                    import_id,
+                    file_path,
+                    relative_path=relative_paths[file_path.parent],
+                ): file_path
+                for file_path in file_paths
+            }
+            try:
+                for future in concurrent.futures.as_completed(futures):
+                    if future.result():
+                        successful += 1
+                        logger.info("✅ Added file to import: %s", futures[future].name)
+                    else:
+                        failed += 1
+            except BaseException:
+                # Don't start the queued uploads on Ctrl-C or an unexpected error
+                executor.shutdown(wait=True, cancel_futures=True)
+                raise
+        
+        if not self.access_token:
+            # A worker hit a 401; drop the header now that no worker is using the session
+            self.session.headers.pop('Authorization', None)
         
         logger.info(f"✅ Upload complete: {successful} successful, {failed} failed (import ID: {import_id})")
         
@@ -489,4 +676,7 @@ class SleepHQClient:
             else:
                 logger.error("Failed to trigger processing")
         
+        # Saved last so the optional cache can never hold up processing the import
+        self._save_hash_cache()
+        
         return successful, failed
@@ -1,9 +1,12 @@
 import logging
-import getpass
+import os
 import pathlib
 
 logger = logging.getLogger('ezshare_resmed')
 
+# Root files SleepHQ needs with every import
+MANDATORY_FILES = ('STR.edf', 'Identification.crc', 'Identification.json')
+
 def upload_to_sleephq(ezshare, sleephq_client, verbose, force=False, username=None, password=None):
     """
     Uploads the entire SD card mirror directory to SleepHQ.
@@ -32,7 +35,8 @@ def upload_to_sleephq(ezshare, sleephq_client, verbose, force=False, username=No
                 logger.error("Failed to authenticate with SleepHQ using provided credentials")
                 return
         else:
-            # Prompt for credentials
+            # Prompt for credentials (getpass is only needed on this interactive path)
+            import getpass
             print("\nSleepHQ authentication required")
             username = input("SleepHQ username/email: ").strip()
             password = getpass.getpass("SleepHQ password: ")
@@ -46,61 +50,76 @@ def upload_to_sleephq(ezshare, sleephq_client, verbose, force=False, username=No
     # 2. SETTINGS/ folder contents
     # 3. DATALOG/ subfolders that have new data (or all if force=True)
     
-    files_to_upload = []
-    added_paths = set()
+    # Insertion-ordered set of paths; re-adding a path is a no-op
+    unique_paths = {}
 
     def add_file(path):
-        if path.is_file() and not path.name.startswith('.') and path not in added_paths:
-            files_to_upload.append(path)
-            added_paths.add(path)
+        if not path.name.startswith('.'):
+            unique_paths[path] = None
+
+    def add_tree(directory):
+        # os.walk separates files from directories using the cached dirent
+        # type, so no extra stat is needed per entry
+        for root, _, filenames in os.walk(directory):
+            for filename in filenames:
+                add_file(pathlib.Path(root, filename))
 
     # 1. Mandatory Root Files
-    MANDATORY_FILES = {'STR.edf', 'Identification.crc', 'Identification.json'}
     for filename in MANDATORY_FILES:
         f = ezshare.path / filename
-        if f.exists():
+        if f.is_file():
             add_file(f)
 
     # 2. SETTINGS folder
-    settings_dir = ezshare.path / 'SETTINGS'
-    if settings_dir.exists():
-        for f in settings_dir.rglob('*'):
-            add_file(f)
+    add_tree(ezshare.path / 'SETTINGS')
 
     # 3. DATALOG folders
     # Identify "active" DATALOG folders from downloaded_files
-    active_datalog_folders = set()
+    active = set()
     if not force:
+        # downloaded_files holds str(ezshare.path / ...) paths, so building the
+        # prefix the same way lets a plain prefix check find files inside a
+        # DATALOG date folder
+        datalog_prefix = str(ezshare.path / 'DATALOG') + os.sep
         for downloaded_file in ezshare.downloaded_files:
-            path = pathlib.Path(downloaded_file)
+            if downloaded_file.startswith(datalog_prefix):
+                tail = downloaded_file[len(datalog_prefix):]
+                sep_index = tail.find(os.sep)
+                if sep_index > 0:
+                    # The first component after DATALOG is the date folder
+                    active.add(tail[:sep_index])
+                continue
+            
+            # Fall back to comparing parsed paths for anything written differently
             try:
-                # Check if file is inside a DATALOG subfolder
-                rel_path = path.relative_to(ezshare.path)
-                parts = rel_path.parts
-                if len(parts) >= 3 and parts[0] == 'DATALOG':
-                    # parts[0] is DATALOG, parts[1] is the date folder
-                    active_datalog_folders.add(parts[1])
+                parts = pathlib.Path(downloaded_file).relative_to(ezshare.path).parts
             except ValueError:
                 continue
+            if len(parts) >= 3 and parts[0] == 'DATALOG':
+                # parts[0] is DATALOG, parts[1] is the date folder
+                active.add(parts[1])
+    active_datalog_folders = frozenset(active)
     
     datalog_dir = ezshare.path / 'DATALOG'
-    if datalog_dir.exists():
-        for date_folder in datalog_dir.iterdir():
-            if not date_folder.is_dir():
-                continue
-            
-            # Include if force=True or if it's an active folder
-            if force or date_folder.name in active_datalog_folders:
-                for f in date_folder.rglob('*'):
-                    add_file(f)
+    if datalog_dir.is_dir():
+        with os.scandir(datalog_dir) as entries:
+            for date_folder in entries:
+                if not date_folder.is_dir():
+                    continue
+                
+                # Include if force=True or if it's an active folder
+                if force or date_folder.name in active_datalog_folders:
+                    add_tree(date_folder.path)
     
+    files_to_upload = list(unique_paths)
     if not files_to_upload:
         logger.info("No data files found in SD card directory")
         return
     
     # Upload files
     logger.info(f"Found {len(files_to_upload)} file(s) in {ezshare.path} to upload to SleepHQ")
-    logger.debug(f"Files to upload: {[str(f) for f in files_to_upload[:10]]}{'...' if len(files_to_upload) > 10 else ''}")
+    if logger.isEnabledFor(logging.DEBUG):
+        logger.debug(f"Files to upload: {[str(f) for f in files_to_upload[:10]]}{'...' if len(files_to_upload) > 10 else ''}")
     successful, failed = sleephq_client.upload_files(
         files_to_upload,
         base_path=ezshare.path,
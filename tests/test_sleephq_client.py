@@ -0,0 +1,208 @@
+import unittest
+import tempfile
+import shutil
+import hashlib
+import json
+import pathlib
+import sys
+import os
+import time
+from unittest.mock import MagicMock, patch
+
+# Add parent directory to path to import modules
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import requests
+
+import sleephq_client
+
+class TestSleepHQClient(unittest.TestCase):
+    def setUp(self):
+        self.test_dir = tempfile.mkdtemp()
+        self.base_path = pathlib.Path(self.test_dir)
+        self.token_file = self.base_path / "config" / "sleephq_token.json"
+
+        self.data_file = self.base_path / "file.txt"
+        self.data_file.write_bytes(b"Hello, World!")
+
+        self.client = sleephq_client.SleepHQClient("id", "secret", token_file=self.token_file)
+
+    def tearDown(self):
+        shutil.rmtree(self.test_dir)
+
+    def test_content_hash_includes_file_name(self):
+        expected = hashlib.md5(b"Hello, World!file.txt").hexdigest()
+        self.assertEqual(self.client._calculate_content_hash(self.data_file), expected)
+
+    def test_content_hash_cached_across_clients(self):
+        first = self.client._calculate_content_hash(self.data_file)
+        self.client._save_hash_cache()
+
+        # A new client should reuse the stored hash rather than re-reading the file
+        client = sleephq_client.SleepHQClient("id", "secret", token_file=self.token_file)
+        client._load_hash_cache()
+        with patch("builtins.open", side_effect=AssertionError("file was re-hashed")):
+            self.assertEqual(client._calculate_content_hash(self.data_file), first)
+
+    def test_hash_cache_loaded_on_first_use(self):
+        self.assertIsNone(self.client.hash_cache)
+
+        self.client._calculate_content_hash(self.data_file)
+        self.assertEqual(len(self.client.hash_cache), 1)
+
+    def test_hash_cache_only_saved_when_changed(self):
+        self.client._calculate_content_hash(self.data_file)
+        self.client._save_hash_cache()
+        self.assertTrue(self.client.hash_cache_file.exists())
+
+        # Only cache hits since the last save, so nothing should be written
+        self.client._calculate_content_hash(self.data_file)
+        with patch("json.dump", side_effect=AssertionError("hash cache was rewritten")):
+            self.client._save_hash_cache()
+
+    def test_hash_cache_save_failure_removes_temporary_file(self):
+        self.client._calculate_content_hash(self.data_file)
+        with patch("os.replace", side_effect=OSError("disk full")):
+            self.client._save_hash_cache()
+
+        self.assertFalse(self.client.hash_cache_file.exists())
+        self.assertFalse(self.client.hash_cache_file.with_suffix('.tmp').exists())
+
+    def test_hash_cache_entry_without_hash_is_a_miss(self):
+        stat = self.data_file.stat()
+        self.client.hash_cache = {
+            os.path.abspath(self.data_file): {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns},
+        }
+
+        expected = hashlib.md5(b"Hello, World!file.txt").hexdigest()
+        self.assertEqual(self.client._calculate_content_hash(self.data_file), expected)
+        self.assertEqual(self.client.hash_cache[os.path.abspath(self.data_file)]["content_hash"], expected)
+
+    def test_content_hash_recomputed_when_file_changes(self):
+        self.client._calculate_content_hash(self.data_file)
+
+        self.data_file.write_bytes(b"Goodbye, World!")
+        expected = hashlib.md5(b"Goodbye, World!file.txt").hexdigest()
+        self.assertEqual(self.client._calculate_content_hash(self.data_file), expected)
+
+    def test_relative_path_from_sd_card_root(self):
+        datalog_file = self.base_path / "DATALOG" / "20230924" / "file.edf"
+
+        self.assertEqual(self.client._get_relative_path(self.data_file, self.base_path), "./")
+        self.assertEqual(self.client._get_relative_path(datalog_file, self.base_path), "./DATALOG/20230924/")
+        self.assertEqual(self.client._get_relative_path(datalog_file, None), "./")
+        self.assertEqual(self.client._get_relative_path(datalog_file, self.base_path / "DATA"), "./")
+
+    def test_add_missing_file_fails_without_request(self):
+        self.client.access_token = "token"
+        self.client.session.post = MagicMock()
+
+        missing = self.base_path / "missing.edf"
+        self.assertFalse(self.client._add_file_to_import("1", missing, base_path=self.base_path))
+        self.assertFalse(self.client.session.post.called)
+
+    def _authenticate(self):
+        self.client.access_token = "token"
+        self.client.team_id = "team"
+        self.client.token_expiry = time.time() + 3600
+        self.client.session.headers['Authorization'] = "Bearer token"
+
+    def _response(self, status_code=200, json_data=None):
+        response = MagicMock()
+        response.status_code = status_code
+        response.json.return_value = json_data or {}
+        if status_code >= 400:
+            response.raise_for_status.side_effect = requests.exceptions.HTTPError(response=response)
+        return response
+
+    def _upload_with_results(self, results):
+        self._authenticate()
+        file_paths = []
+        for i, ok in enumerate(results):
+            file_path = self.base_path / f"file{i}.edf"
+            file_path.write_bytes(b"ok" if ok else b"fail")
+            file_paths.append(file_path)
+
+        def post(url, **kwargs):
+            if url.endswith("/imports"):
+                return self._response(json_data={"data": {"id": 1}})
+            if url.endswith("/process_files"):
+                return self._response()
+            body = kwargs["files"]["file"][1].read()
+            return self._response(status_code=200 if body == b"ok" else 422)
+        self.client.session.post = MagicMock(side_effect=post)
+
+        with patch.object(self.client, "process_import", wraps=self.client.process_import) as process_import:
+            counts = self.client.upload_files(file_paths, base_path=self.base_path)
+        return counts, process_import
+
+    def test_upload_files_counts_results_and_processes(self):
+        counts, process_import = self._upload_with_results([True, True, False])
+
+        self.assertEqual(counts, (2, 1))
+        process_import.assert_called_once_with("1")
+
+    def test_upload_files_skips_processing_when_nothing_uploaded(self):
+        counts, process_import = self._upload_with_results([False, False])
+
+        self.assertEqual(counts, (0, 2))
+        self.assertFalse(process_import.called)
+
+    def test_hash_cache_save_failure_does_not_block_processing(self):
+        with patch.object(pathlib.Path, "mkdir", side_effect=OSError("read-only")):
+            counts, process_import = self._upload_with_results([True])
+
+        self.assertEqual(counts, (1, 0))
+        process_import.assert_called_once_with("1")
+        self.assertFalse(self.client.hash_cache_file.with_suffix('.tmp').exists())
+
+    def test_malformed_hash_cache_file_is_ignored(self):
+        self.client.hash_cache_file.parent.mkdir(parents=True)
+        self.client.hash_cache_file.write_text("[]")
+
+        counts, process_import = self._upload_with_results([True, False])
+
+        self.assertEqual(counts, (1, 1))
+        process_import.assert_called_once_with("1")
+        self.assertIsInstance(json.loads(self.client.hash_cache_file.read_text()), dict)
+
+    def test_malformed_hash_cache_entries_are_rehashed(self):
+        file_paths = [self.base_path / f"file{i}.edf" for i in range(2)]
+        self.client.hash_cache_file.parent.mkdir(parents=True)
+        self.client.hash_cache_file.write_text(json.dumps({
+            os.path.abspath(file_paths[0]): "not a record",
+            os.path.abspath(file_paths[1]): {"size": "2", "mtime_ns": None, "content_hash": 5},
+        }))
+
+        counts, process_import = self._upload_with_results([True, True])
+
+        self.assertEqual(counts, (2, 0))
+        process_import.assert_called_once_with("1")
+        for i, file_path in enumerate(file_paths):
+            expected = hashlib.md5(b"ok" + file_path.name.encode('utf-8')).hexdigest()
+            self.assertEqual(self.client.hash_cache[os.path.abspath(file_path)]["content_hash"], expected)
+
+    def test_upload_stops_after_token_rejected(self):
+        self._authenticate()
+        file_paths = []
+        for i in range(50):
+            file_path = self.base_path / f"file{i}.edf"
+            file_path.touch()
+            file_paths.append(file_path)
+
+        def post(url, **kwargs):
+            if url.endswith("/imports"):
+                return self._response(json_data={"data": {"id": 1}})
+            return self._response(status_code=401)
+        self.client.session.post = MagicMock(side_effect=post)
+
+        successful, failed = self.client.upload_files(file_paths, base_path=self.base_path)
+
+        self.assertEqual((successful, failed), (0, 50))
+        # Only uploads already in flight when the 401 arrived should have been sent
+        upload_calls = self.client.session.post.call_count - 1
+        self.assertLessEqual(upload_calls, sleephq_client.UPLOAD_WORKERS)
+        self.assertNotIn('Authorization', self.client.session.headers)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -100,5 +100,43 @@ class TestUploadLogic(unittest.TestCase):
         self.assertIn("file2.edf", file_names)
         self.assertIn("STR.edf", file_names)
 
+    def test_nested_files_included_and_hidden_files_skipped(self):
+        nested_dir = self.settings_dir / "nested"
+        nested_dir.mkdir()
+        (nested_dir / "nested.dat").touch()
+        (self.settings_dir / ".hidden").touch()
+        (self.date2_dir / "._file2.edf").touch()
+        self.ezshare_mock.downloaded_files = [str(self.date2_dir / "file2.edf")]
+
+        sleephq_uploader.upload_to_sleephq(self.ezshare_mock, self.sleephq_client_mock, verbose=True)
+
+        args, _ = self.sleephq_client_mock.upload_files.call_args
+        files_to_upload = args[0]
+        file_names = [f.name for f in files_to_upload]
+
+        self.assertIn("nested.dat", file_names)
+        self.assertIn("file2.edf", file_names)
+        self.assertNotIn(".hidden", file_names)
+        self.assertNotIn("._file2.edf", file_names)
+        self.assertEqual(len(file_names), len(set(files_to_upload)))
+
+    def test_incremental_upload_with_relative_path(self):
+        # ezshare.path is relative when --path is given as e.g. "."
+        cwd = os.getcwd()
+        os.chdir(self.test_dir)
+        try:
+            self.ezshare_mock.path = pathlib.Path('.')
+            self.ezshare_mock.downloaded_files = [str(pathlib.Path('.') / "DATALOG" / "20230102" / "file2.edf")]
+
+            sleephq_uploader.upload_to_sleephq(self.ezshare_mock, self.sleephq_client_mock, verbose=True)
+        finally:
+            os.chdir(cwd)
+
+        args, _ = self.sleephq_client_mock.upload_files.call_args
+        file_names = [f.name for f in args[0]]
+
+        self.assertIn("file2.edf", file_names)
+        self.assertNotIn("file1.edf", file_names)
+
 if __name__ == '__main__':
     unittest.main()